@@ -7,6 +7,7 @@
         - anansi TEXT [-z]
         - anansi FILE(s) [-Rz] [-q | -v ] [--pattern PATTERN]
         - anansi TEMPLATE [-Rz] [-q | -v] [--pattern PATTERN]
+        - anansi run [--pattern PATTERN] [--] COMMAND [ARGS ...]
         - anansi [--help | --version]
 
     Options:
@@ -22,6 +23,11 @@
         --debug                 Show debug info and test results.
         -h, --help              Show this screen.
 
+    Templates:
+        Markup such as '{BLUE}text{RESET}' or '[bold red]text[/]' is
+        printed in color. Other {NAME} fields are filled in from
+        environment variables, e.g. 'anansi "[bold]{USER}[/] is here"'.
+
     Exit status:
 
         0 if all file names were printed without issue.
@@ -45,16 +51,28 @@
 # !-------------------------------------------------------------- Imports
 
 if True:  # builtins
+    import atexit
+    import logging
+    import os
     import re
     import sys
+    from array import array
+    from bisect import bisect_left, bisect_right
+    from collections import deque
     from dataclasses import dataclass
     from enum import Enum, auto
     from functools import lru_cache
     from io import TextIOWrapper
+    from itertools import chain, islice
+    from logging.handlers import QueueHandler, QueueListener
     from os import linesep, environ
+    from queue import SimpleQueue
     from sys import stdout, stderr, platform
+    from threading import Event, Thread
     from time import sleep
-    from typing import Any, Iterator, List, Tuple
+    from typing import (Any, Iterable, Iterator, List, NamedTuple, Sequence,
+                        Tuple)
+    from unicodedata import east_asian_width
 
 if True:  # external
     import anansi
@@ -91,7 +109,6 @@ def supports_color():
 SUPPORTS_COLOR: bool = supports_color()
 
 # !-------------------------------------------------------------- DEBUGGING
-_SET_DEBUG: bool = True                     # True = use Debug features
 _NL:     str = linesep                       # os specific Newline
 _RESET = "\x1B[0m"                          # private ansi code
 _DEBUG_COLOR: str = "\x1B[38;5;178m"        # private ansi code
@@ -99,39 +116,92 @@ _DEBUG_fmt = f" {_DEBUG_COLOR}<-- debug{_RESET}{_NL}"    # debug tag
 _WIDTH = 80
 
 
+def _noop(*args, **kwargs):
+    """ Stand in for disabled debug levels. """
+
+
+class DebugChannel:
+    """ Levelled debug output with deferred formatting.
+
+        Each level method is either an emitter or a shared no-op, chosen
+        when the level is set, so a disabled call costs one attribute
+        lookup and an empty call; messages are only formatted when shown.
+
+            db.debug('row %d: %r', i, row)          # - %-style args
+            db.trace(lambda: expensive_summary())   # - callables
+            if db.on:                               # - guard whole blocks
+                ...
+
+        level - 'info', 'debug', 'trace', a number or '' / '0' for off
+                (default: $ANANSI_DEBUG; '1' means 'debug')
+        file  - output stream (default: stderr at the time of the call)
+        """
+    LEVELS = {'info': 20, 'debug': 10, 'trace': 5}
+
+    def __init__(self, level: Any = None, file=None,
+                 env: str = 'ANANSI_DEBUG'):
+        self.file = file
+        self.set_level(environ.get(env, '') if level is None else level)
+
+    def set_level(self, level: Any):
+        """ Enable <level> and everything above it; falsy turns all off. """
+        if isinstance(level, str):
+            level = level.strip().lower()
+            if level in self.LEVELS:
+                level = self.LEVELS[level]
+            elif level.isdigit():
+                level = int(level)
+                if level == 1:
+                    level = self.LEVELS['debug']
+            else:
+                on = level in ('true', 'yes', 'on')
+                level = self.LEVELS['debug'] if on else 0
+        self.level: int = level or 0
+        self.on: bool = bool(self.level)
+        for name, value in self.LEVELS.items():
+            shown = self.on and value >= self.level
+            setattr(self, name, self._emitter(name) if shown else _noop)
+
+    def _emitter(self, name: str):
+        def emit(msg: Any, *args):
+            if callable(msg):
+                msg = msg()
+            elif args:
+                msg = msg % args
+            if SUPPORTS_COLOR:
+                msg = f'{_DEBUG_COLOR}{msg}{_RESET}'
+            (self.file or sys.stderr).write(f'{msg}\n')
+        emit.__name__ = name
+        return emit
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(level={self.level})'
+
+
+db = DebugChannel()                         # - $ANANSI_DEBUG, or --debug
+
+
 def dbprint(*db_args, sep='', file=stderr, **db_kwargs):
-    ''' Prints debug messages if _SET_DEBUG flag is True.
+    ''' Prints debug messages if the debug channel <db> is on.
 
-        - db - boolean flag for debug state
-        - color - keyword argument for print color. (default: Ansi.WARN)
+        Arguments are formatted only when debugging is on; prefer
+        `db.debug()` in hot code, since f-string arguments here are still
+        built before the check.
 
         Example:
         ```py
         if args[0] == '--version':
             dbprint(f"{Ansi.MAIN}anansi.py{Ansi.RESET} version {__version__}.",
-                    db = _SET_DEBUG, end=f"<--debug{os.linesep}")
+                    end=f"<--debug{os.linesep}")
         ```
 
         '''
-    if _SET_DEBUG:
+    if db.on:
         if not SUPPORTS_COLOR:
             print(*db_args, sep=sep, file=file, **db_kwargs)
         else:
-            arg_str: str = ""
-            # print(_DEBUG_COLOR, db_args)
-            for s in db_args:
-                try:
-                    arg_str += str(s)
-                    arg_str += sep
-                except:
-                    pass
-            print(f'{_DEBUG_COLOR}', s, sep=sep, file=file, **db_kwargs)
-            # arg_str = arg_str[0:-(len(sep))]
-            # fmt2 = f"{_DEBUG_COLOR}{arg_str}"
-            # # print(len(fmt1))
-            # fmt1 = fmt2 + ' ' * (_WIDTH - len(fmt2))
-            # fmt = f"{fmt1}{_DEBUG_fmt}"
-            # file.write(f"{fmt}")
+            msg = sep.join(map(str, db_args))
+            print(f'{_DEBUG_COLOR}{msg}{_RESET}', file=file, **db_kwargs)
 
 
 ''' <aside>            NewLine, A Bit of Lore
@@ -593,6 +663,1845 @@ class Ansi(str):  # ? just object? maybe some more functionality?
 
 a = Ansi()
 
+# !------------------------------------------------ Templates
+
+''' Template markup refers to `Ansi` color and effect names in two forms:
+
+        {BLUE}text{RESET}           - an upper case style name in braces
+        [bold red on blue]text[/]   - lower case style words; `on` selects
+                                      the background
+
+    Style names are those in STYLE_NAMES plus the 256 color families
+    COLOR<n>, GREY<n>, BG_COLOR<n> and BG_GREY<n>. Any other `{name}` or
+    `{0}` is a field filled in at render time; use `{{` and `}}` for
+    literal braces. Brackets that do not hold lower case style words are
+    left alone, so `[1/2]`, `[WARN]` or `[WARNING]` pass through as text.
+    '''
+
+STYLE_NAMES = frozenset((
+    'MAIN', 'WARN', 'BLUE', 'GO', 'CHERRY', 'CANARY', 'ATTN', 'RAIN',
+    'WHITE', 'RESET', 'RESTORE',
+    'BOLD', 'FAINT', 'ITALIC', 'IT', 'UNDERLINE', 'UL', 'BLINK', 'REVERSE',
+    'CONCEAL', 'STRIKE', 'FRAME', 'CIRCLE', 'OVERLINE',
+    'BLACK', 'RED', 'GREEN', 'YELLOW', 'BLUE7', 'MAGENTA', 'CYAN',
+    'BRIGHTBLACK', 'BRIGHTRED', 'BRIGHTGREEN', 'BRIGHTYELLOW',
+    'BRIGHTBLUE', 'BRIGHTMAGENTA', 'BRIGHTCYAN', 'BRIGHTWHITE',
+    'BBLACK', 'BRED', 'BGREEN', 'BYELLOW', 'BBLUE', 'BMAGENTA', 'BCYAN',
+    'BWHITE',
+    'BBRIGHTBLACK', 'BBRIGHTRED', 'BBRIGHTGREEN', 'BBRIGHTYELLOW',
+    'BBRIGHTBLUE', 'BBRIGHTMAGENTA', 'BBRIGHTCYAN', 'BBRIGHTWHITE',
+))
+RE_8BIT_NAME = re.compile(r'(?:BG_)?(?:COLOR|GREY)\d{1,3}')
+
+RE_TEMPLATE = re.compile(r'''
+    (?P<lbrace>\{\{)
+    | (?P<rbrace>\}\})
+    | \{(?P<field>[A-Za-z_][A-Za-z0-9_]*|\d+)\}
+    | \[(?P<tag>/[a-z0-9_ ]*|[a-z][a-z0-9_ ]*)\]
+    ''', re.VERBOSE)
+
+
+def _ansi_code(name: str) -> Any:
+    """ Return the `Ansi` style string called <name> or None. """
+    if name not in STYLE_NAMES and not RE_8BIT_NAME.fullmatch(name):
+        return None
+    value = getattr(Ansi, name, None)
+    return value if isinstance(value, str) else None
+
+
+def _style_tag(tag: str) -> Any:
+    """ Return the escape string for style words in <tag> or None.
+
+        `[/]` (or any `[/...]`) closes with RESET; `on` puts the next
+        color on the background: `[bold yellow on blue]`.
+        """
+    if tag[0] == '/':
+        return Ansi.RESET
+    codes: List[str] = []
+    background: bool = False
+    for word in tag.upper().split():
+        if word == 'ON':
+            background = True
+            continue
+        if background:
+            code = _ansi_code(f'BG_{word}') or _ansi_code(f'B{word}')
+            background = False
+        else:
+            code = _ansi_code(word)
+        if code is None:
+            return None
+        codes.append(code)
+    return ''.join(codes) if codes and not background else None
+
+
+class Template:
+    """ Markup compiled into a flat list of literal segments and fields.
+
+        Literals (text and escape codes) are resolved once, when compiled;
+        `render()` only drops field values into their slots and joins.
+
+            t = compile_template('[bold]{name}[/] is {GO}{state}{RESET}')
+            t.render(name='disk', state='ok')
+        """
+    __slots__ = ('source', 'parts', 'fields', '_static')
+
+    def __init__(self, source: str, parts: List[str],
+                 fields: List[Tuple[int, Any]]):
+        self.source: str = source
+        self.parts: List[str] = parts
+        self.fields: List[Tuple[int, Any]] = fields
+        self._static: Any = None if fields else ''.join(parts)
+
+    def render(self, *args, **kwargs) -> str:
+        """ Return the template with fields replaced by <args> / <kwargs>.
+
+            Integer fields index <args>, named fields look up <kwargs>;
+            a missing value raises IndexError or KeyError like str.format.
+            """
+        if self._static is not None:
+            return self._static
+        parts: List[str] = self.parts[:]
+        for i, key in self.fields:
+            value = args[key] if isinstance(key, int) else kwargs[key]
+            parts[i] = str(value)
+        return ''.join(parts)
+
+    __call__ = render
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.source!r})'
+
+
+@lru_cache(maxsize=256)
+def compile_template(source: str, color: bool = True) -> Template:
+    """ Compile (and cache) markup <source> into a Template.
+
+        color - False drops the escape codes but keeps text and fields.
+        """
+    parts: List[str] = []
+    fields: List[Tuple[int, Any]] = []
+    text: List[str] = []
+    pos: int = 0
+    for m in RE_TEMPLATE.finditer(source):
+        text.append(source[pos:m.start()])
+        pos = m.end()
+        kind = m.lastgroup
+        if kind == 'lbrace':
+            text.append('{')
+        elif kind == 'rbrace':
+            text.append('}')
+        elif kind == 'tag':
+            code = _style_tag(m.group('tag'))
+            if code is None:
+                text.append(m.group())
+            elif color:
+                text.append(code)
+        else:
+            name: str = m.group('field')
+            code = _ansi_code(name) if name.isupper() else None
+            if code is not None:
+                if color:
+                    text.append(code)
+                continue
+            parts.append(''.join(text))
+            text = []
+            key = int(name) if name.isdigit() else name
+            fields.append((len(parts), key))
+            parts.append('')
+    text.append(source[pos:])
+    parts.append(''.join(text))
+    return Template(source, parts, fields)
+
+
+def render_template(source: str, *args, **kwargs) -> str:
+    """ Render markup <source>, compiling it on first use. """
+    template = compile_template(source, SUPPORTS_COLOR)
+    return template.render(*args, **kwargs)
+
+# !------------------------------------------------ Tables
+
+
+def visible_width(s: str) -> int:
+    """ Return the terminal column width of <s>, ignoring escape codes.
+
+        East Asian wide and full width characters count as 2 columns.
+        """
+    if '\x1B' in s or '\x9B' in s:
+        s = Ansi.ANSI_ESCAPE.sub('', s)
+    if s.isascii():
+        return len(s)
+    return sum(2 if east_asian_width(c) in 'WF' else 1 for c in s)
+
+
+def _is_number(cell: Any) -> bool:
+    return isinstance(cell, (int, float)) and not isinstance(cell, bool)
+
+
+def table_lines(rows: Iterable[Sequence[Any]],
+                headers: Sequence[Any] = (),
+                sample: Any = 1000,
+                styles: Sequence[str] = (),
+                sep: str = ' | ',
+                color: bool = True,
+                ) -> Iterator[str]:
+    """ Yield a table one line at a time; the table is never built whole.
+
+        Column widths come from <headers> and the first <sample> rows, so
+        memory stays flat and the first line is out before the input ends;
+        later cells wider than their column simply run long.
+
+        sample - rows to measure (default: 1000); None scans all rows in a
+                 first pass, so <rows> must be re-iterable (e.g. a list)
+        styles - per column escape strings, e.g. (Ansi.BOLD, Ansi.GO)
+        sep    - column separator
+        color  - False drops header and column styles
+
+        Number columns are right aligned, everything else left aligned.
+        Cells past the measured columns are written unstyled and unpadded.
+        """
+    if sample is None:
+        if iter(rows) is rows:
+            raise TypeError('a full width scan needs re-iterable rows, '
+                            'not an iterator')
+        head: List[Sequence[Any]] = []
+        body: Iterable[Sequence[Any]] = rows
+        measured: Iterable[Sequence[Any]] = rows
+    else:
+        it = iter(rows)
+        head = list(islice(it, sample))
+        body = chain(head, it)
+        measured = head
+
+    widths: List[int] = [visible_width(str(h)) for h in headers]
+    numeric: List[bool] = [True] * len(widths)
+    for row in measured:
+        for i, cell in enumerate(row):
+            w = visible_width(str(cell))
+            if i < len(widths):
+                if w > widths[i]:
+                    widths[i] = w
+                numeric[i] = numeric[i] and _is_number(cell)
+            else:
+                widths.append(w)
+                numeric.append(_is_number(cell))
+    del head
+
+    reset: str = Ansi.RESET if color else ''
+    pre: List[str] = [s if color else '' for s in styles]
+    pre += [''] * (len(widths) - len(pre))
+    post: List[str] = [reset if p else '' for p in pre]
+    last: int = len(widths) - 1
+
+    def line(row: Sequence[Any], pre: List[str], post: List[str]) -> str:
+        cells: List[str] = []
+        for i, cell in enumerate(row):
+            s = str(cell)
+            if i > last:  # - never measured
+                cells.append(s)
+                continue
+            pad = ' ' * (widths[i] - visible_width(s))
+            if numeric[i]:
+                cells.append(f'{pad}{pre[i]}{s}{post[i]}')
+            elif i == last:
+                cells.append(f'{pre[i]}{s}{post[i]}')
+            else:
+                cells.append(f'{pre[i]}{s}{post[i]}{pad}')
+        return sep.join(cells)
+
+    if headers:
+        bold: List[str] = [Ansi.BOLD if color else ''] * len(widths)
+        yield line(headers, bold, [reset] * len(widths))
+        yield sep.join('-' * w for w in widths).replace(' ', '-')
+    for row in body:
+        yield line(row, pre, post)
+
+
+def print_table(rows: Iterable[Sequence[Any]], *args, file=stdout,
+                **kwargs):
+    """ Stream a table to <file> line by line; see `table_lines`. """
+    color: bool = kwargs.pop('color', SUPPORTS_COLOR)
+    write = file.write
+    for s in table_lines(rows, *args, color=color, **kwargs):
+        write(f'{s}\n')
+
+# !------------------------------------------------ Batched output
+
+
+class BatchWriter:
+    """ Thread safe output multiplexer that writes whole records in batches.
+
+        Producers push complete records onto a deque (append is atomic, so
+        no lock is taken) and return at once; one writer thread drains the
+        queue every <interval> seconds, or sooner once <batch> records are
+        waiting, and hands each batch to <file> in a single write.
+
+            with BatchWriter() as out:
+                out.print(f"{Ansi.GO}ok{Ansi.RESET}", name)
+
+        file     - output stream (default: stdout)
+        interval - seconds between flushes (default: 0.05)
+        batch    - max records per write (default: 1024)
+        """
+
+    def __init__(self, file=None, interval: float = 0.05, batch: int = 1024):
+        self.file = stdout if file is None else file
+        self.interval: float = interval
+        self.batch: int = batch
+        self._queue: deque = deque()
+        self._wake: Event = Event()
+        self._closed: bool = False
+        self._thread: Thread = Thread(target=self._run, name='anansi-writer',
+                                      daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def put(self, record: str):
+        """ Queue one complete record (include its own newline). """
+        if self._closed:
+            raise ValueError('write to closed BatchWriter')
+        self._queue.append(record)
+        if len(self._queue) >= self.batch:
+            self._wake.set()
+
+    def print(self, *args, sep: str = ' ', end: str = '\n'):
+        """ Queue <args> as one record, formatted like print(). """
+        self.put(sep.join(map(str, args)) + end)
+
+    def flush(self):
+        """ Ask the writer thread to write what is queued now. """
+        self._wake.set()
+
+    def close(self):
+        """ Write everything still queued and stop the writer thread. """
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._thread.join()
+        atexit.unregister(self.close)
+
+    def _drain(self):
+        queue: deque = self._queue
+        popleft = queue.popleft
+        try:
+            while queue:
+                n: int = min(len(queue), self.batch)
+                self.file.write(''.join([popleft() for _ in range(n)]))
+            self.file.flush()
+        except (OSError, ValueError):   # - closed file or broken pipe
+            queue.clear()
+
+    def _run(self):
+        while True:
+            closed: bool = self._closed
+            if not closed:
+                self._wake.wait(self.interval)
+                self._wake.clear()
+            try:
+                self._drain()
+            except Exception as e:  # - keep the thread alive; drop the batch
+                print(f'anansi: BatchWriter dropped a batch: {e!r}',
+                      file=sys.stderr)
+            if closed:
+                break
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# !------------------------------------------------ Logging
+
+
+def _isatty(stream) -> bool:
+    return hasattr(stream, 'isatty') and stream.isatty()
+
+
+class AnsiFormatter(logging.Formatter):
+    """ logging.Formatter that adds colored `%(color_level)s` and
+        `%(color_name)s` fields to each record.
+
+        The styled level and logger name strings are built once per level
+        and per logger and then looked up, so no escape codes are formatted
+        per record.
+
+        styles     - {levelno: escape string}, merged over LEVEL_STYLES
+        name_style - escape string for the logger name (default: Ansi.MAIN)
+        color      - True or False to force; None (default) colors only
+                     when the handler's stream is a tty (AnsiStreamHandler)
+                     or, for other handlers, when stderr is
+        """
+    LEVEL_STYLES = {
+        logging.DEBUG: Ansi.BLUE,
+        logging.INFO: Ansi.GO,
+        logging.WARNING: Ansi.CANARY,
+        logging.ERROR: Ansi.WARN,
+        logging.CRITICAL: Ansi.BOLD + Ansi.CHERRY,
+    }
+    DEFAULT_FMT: str = '%(color_level)s %(color_name)s: %(message)s'
+
+    def __init__(self, fmt: str = DEFAULT_FMT, datefmt=None, styles=None,
+                 name_style: str = Ansi.MAIN, color: Any = None):
+        super().__init__(fmt, datefmt)
+        self.color: Any = color
+        self.styles = {**self.LEVEL_STYLES, **(styles or {})}
+        self.name_style: str = name_style
+        self._stderr_color: Any = None
+        self._levels: dict = {}     # - (levelno, color) -> str
+        self._names: dict = {}      # - (name, color) -> str
+
+    def _level(self, levelno: int, levelname: str, color: bool) -> str:
+        style: str = self.styles.get(levelno, '') if color else ''
+        s: str = f'{levelname:<8}'
+        if style:
+            s = f'{style}{s}{Ansi.RESET}'
+        self._levels[levelno, color] = s
+        return s
+
+    def _name(self, name: str, color: bool) -> str:
+        s = f'{self.name_style}{name}{Ansi.RESET}' if color else name
+        self._names[name, color] = s
+        return s
+
+    def format(self, record: logging.LogRecord, color: Any = None) -> str:
+        """ Format <record>; <color> is the handler's choice when
+            self.color is None. """
+        if self.color is not None:
+            color = self.color
+        elif color is None:
+            if self._stderr_color is None:
+                self._stderr_color = _isatty(sys.stderr)
+            color = self._stderr_color
+        levelno: int = record.levelno
+        name: str = record.name
+        record.color_level = (
+            self._levels.get((levelno, color))
+            or self._level(levelno, record.levelname, color))
+        record.color_name = (self._names.get((name, color))
+                             or self._name(name, color))
+        return super().format(record)
+
+
+class AnsiStreamHandler(logging.StreamHandler):
+    """ StreamHandler that tells its AnsiFormatter whether the stream is a
+        tty, so color switches off for files and pipes.
+
+        fmt_kwargs - passed on to AnsiFormatter
+        """
+
+    def __init__(self, stream=None, **fmt_kwargs):
+        super().__init__(stream)
+        self._color: bool = _isatty(self.stream)
+        self.setFormatter(AnsiFormatter(**fmt_kwargs))
+
+    def setStream(self, stream):
+        old = super().setStream(stream)
+        self._color = _isatty(self.stream)
+        return old
+
+    def format(self, record: logging.LogRecord) -> str:
+        if isinstance(self.formatter, AnsiFormatter):
+            return self.formatter.format(record, self._color)
+        return super().format(record)
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """ QueueHandler that merges the message args on the calling thread and
+        leaves coloring and the rest of the formatting to the listener. """
+
+    listener: Any = None
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def queue_logging(logger=None, stream=None, level: int = logging.NOTSET,
+                  **fmt_kwargs) -> QueueListener:
+    """ Route <logger> through a queue to a colored stream handler.
+
+        The calling thread only merges the message with its args, so the
+        log shows values as they were at the call, and puts the record on
+        a queue; coloring, the rest of the formatting and I/O run on the
+        QueueListener thread. Color is used only if <stream> is a tty.
+        Returns the started listener; it is stopped at exit. Calling it
+        again for the same logger replaces the earlier setup.
+
+        logger - logger or logger name (default: root logger)
+        stream - output stream (default: stderr)
+        fmt_kwargs - passed on to AnsiFormatter
+        """
+    if not isinstance(logger, logging.Logger):
+        logger = logging.getLogger(logger)
+    for old in [h for h in logger.handlers
+                if isinstance(h, _DeferredQueueHandler)]:
+        logger.removeHandler(old)
+        _stop_listener(old.listener)
+    handler = AnsiStreamHandler(stderr if stream is None else stream,
+                                **fmt_kwargs)
+    queue: SimpleQueue = SimpleQueue()
+    queue_handler = _DeferredQueueHandler(queue)
+    logger.addHandler(queue_handler)
+    if level:
+        logger.setLevel(level)
+    listener = QueueListener(queue, handler, respect_handler_level=True)
+    queue_handler.listener = listener
+    listener.start()
+    atexit.register(_stop_listener, listener)
+    return listener
+
+
+def _stop_listener(listener: QueueListener):
+    try:
+        listener.stop()
+    except AttributeError:  # - already stopped
+        pass
+
+# !------------------------------------------------ Styles
+
+
+@lru_cache(maxsize=4096)
+def _style_params(value: int) -> str:
+    """ Return the SGR parameter string (e.g. '1;38;5;22') for <value>. """
+    codes: List[str] = [str(c) for c, bit in Style.EFFECT_BITS.items()
+                        if value & bit]
+    for mode_shift, shift, base in ((Style.FG_MODE, Style.FG, 30),
+                                    (Style.BG_MODE, Style.BG, 40)):
+        mode: int = (value >> mode_shift) & 3
+        n: int = (value >> shift) & 0xFFFFFF
+        if mode == Style.BASIC:
+            codes.append(str(base + n if n < 8 else base + 52 + n))
+        elif mode == Style.PALETTE:
+            codes.append(f'{base + 8};5;{n}')
+        elif mode == Style.RGB:
+            r, g, b = n >> 16, (n >> 8) & 0xFF, n & 0xFF
+            codes.append(f'{base + 8};2;{r};{g};{b}')
+    return Ansi.ANSI_SEP.join(codes)
+
+
+@lru_cache(maxsize=4096)
+def _style_sgr(value: int) -> str:
+    """ Return the minimal `CSI ... m` string for <value>. """
+    if not value:
+        return Ansi.RESET
+    return f'{Ansi.CSI}{_style_params(value)}{Ansi.SUFFIX}'
+
+
+class Style(int):
+    """ A text style packed into one interned int.
+
+            bits  0-10  effects (one bit per SGR code in EFFECTS)
+            bits 12-13  foreground mode (0 default, 1 basic, 2 palette, 3 rgb)
+            bits 14-15  background mode
+            bits 16-39  foreground value (0-15, 0-255 or 0xRRGGBB)
+            bits 40-63  background value
+
+        `==` is an O(1) int compare. Palette and effect styles are
+        interned, so equal ones are also the same object; truecolor
+        styles, and any beyond INTERN_MAX, are not kept, so parsing
+        truecolor streams doesn't grow memory.
+
+        `a | b` adds the effects of <b> and takes its colors where it has
+        them. `&`, `^` and `~` are plain bit operations that return a
+        Style, for masking and diffing with the *_MASK fields:
+
+            style & ~Style(Style.FG_MASK)       # - drop the foreground
+            (a ^ b).effects                     # - effects that differ
+
+        `str(style)` or f'{style}' is the minimal SGR string.
+
+            warn = Style.parse(Ansi.BOLD + Ansi.WARN)
+            print(f'{warn}careful{Style()}')
+        """
+    __slots__ = ()
+
+    EFFECTS: Tuple[int, ...] = (1, 2, 3, 4, 5, 7, 8, 9, 51, 52, 53)
+    EFFECT_BITS = {code: 1 << i for i, code in enumerate(EFFECTS)}
+    EFFECT_MASK: int = (1 << len(EFFECTS)) - 1
+    EFFECT_OFF = {22: 0b11, 23: 1 << 2, 24: 1 << 3, 25: 1 << 4, 27: 1 << 5,
+                  28: 1 << 6, 29: 1 << 7, 54: 0b11 << 8, 55: 1 << 10}
+
+    BASIC, PALETTE, RGB = 1, 2, 3
+    FG_MODE, BG_MODE, FG, BG = 12, 14, 16, 40
+    FG_MASK: int = (3 << FG_MODE) | (0xFFFFFF << FG)
+    BG_MASK: int = (3 << BG_MODE) | (0xFFFFFF << BG)
+    MASK: int = (1 << 64) - 1
+
+    INTERN_MAX: int = 65536
+    _interned: dict = {}
+
+    def __new__(cls, value: int = 0):
+        try:
+            return cls._interned[value]
+        except KeyError:
+            pass
+        self = super().__new__(cls, value)
+        rgb: bool = ((value >> cls.FG_MODE) & 3 == cls.RGB
+                     or (value >> cls.BG_MODE) & 3 == cls.RGB)
+        if not rgb and len(cls._interned) < cls.INTERN_MAX:
+            cls._interned[value] = self
+        return self
+
+    @classmethod
+    def make(cls, *effects: int, fg: Any = None, bg: Any = None) -> 'Style':
+        """ Return a Style from SGR effect codes and colors.
+
+            fg, bg - None (default), 0-255 for the 256 color palette or
+                     an (r, g, b) tuple for truecolor
+            """
+        value: int = 0
+        for code in effects:
+            value |= cls.EFFECT_BITS[code]
+        for color, mode, shift in ((fg, cls.FG_MODE, cls.FG),
+                                   (bg, cls.BG_MODE, cls.BG)):
+            if color is None:
+                continue
+            if isinstance(color, tuple):
+                r, g, b = color
+                value |= cls.RGB << mode | (r << 16 | g << 8 | b) << shift
+            else:
+                value |= cls.PALETTE << mode | (color & 0xFF) << shift
+        return cls(value)
+
+    @classmethod
+    @lru_cache(maxsize=1024)
+    def parse(cls, s: str) -> 'Style':
+        """ Return the Style set by the SGR sequences in <s>, e.g.
+            `Style.parse(Ansi.BOLD + Ansi.RED)`. """
+        style: Style = cls()
+        for params in RE_SGR.findall(s):
+            style = style.apply(params)
+        return style
+
+    def apply(self, params: Any) -> 'Style':
+        """ Return this Style updated by SGR <params> ('1;31' or [1, 31]). """
+        if isinstance(params, str):
+            params = [int(p) if p else 0 for p in params.split(Ansi.ANSI_SEP)]
+        value: int = int(self)
+        fg = (self.FG_MASK, self.FG_MODE, self.FG)
+        bg = (self.BG_MASK, self.BG_MODE, self.BG)
+        it = iter(params)
+        for p in it:
+            if p == 0:
+                value = 0
+                continue
+            if p in self.EFFECT_BITS:
+                value |= self.EFFECT_BITS[p]
+                continue
+            if p in self.EFFECT_OFF:
+                value &= ~self.EFFECT_OFF[p]
+                continue
+            if 30 <= p <= 37 or 90 <= p <= 97:
+                channel, mode = fg, self.BASIC
+                n = p - 30 if p < 90 else p - 82
+            elif 40 <= p <= 47 or 100 <= p <= 107:
+                channel, mode = bg, self.BASIC
+                n = p - 40 if p < 100 else p - 92
+            elif p == 39 or p == 49:
+                value &= ~(self.FG_MASK if p == 39 else self.BG_MASK)
+                continue
+            elif p == 38 or p == 48:
+                channel = fg if p == 38 else bg
+                kind = next(it, None)
+                if kind == 5:
+                    mode, n = self.PALETTE, next(it, 0) & 0xFF
+                elif kind == 2:
+                    r, g, b = next(it, 0), next(it, 0), next(it, 0)
+                    mode = self.RGB
+                    n = (r & 0xFF) << 16 | (g & 0xFF) << 8 | (b & 0xFF)
+                else:
+                    continue
+            else:
+                continue
+            mask, mode_shift, shift = channel
+            value = value & ~mask | mode << mode_shift | n << shift
+        return Style(value)
+
+    @property
+    def effects(self) -> int:
+        """ Effect bitfield; see EFFECT_BITS. """
+        return int(self) & self.EFFECT_MASK
+
+    @property
+    def fg(self) -> Tuple[int, int]:
+        """ Foreground (mode, value); mode 0 is the terminal default. """
+        return (self >> self.FG_MODE) & 3, (self >> self.FG) & 0xFFFFFF
+
+    @property
+    def bg(self) -> Tuple[int, int]:
+        """ Background (mode, value); mode 0 is the terminal default. """
+        return (self >> self.BG_MODE) & 3, (self >> self.BG) & 0xFFFFFF
+
+    @property
+    def sgr(self) -> str:
+        """ Minimal `CSI ... m` string; the empty Style is RESET. """
+        return _style_sgr(int(self))
+
+    def diff(self, other: 'Style') -> str:
+        """ Return the shortest SGR string that turns this style into <other>.
+
+            Only additions are sent when nothing is turned off; otherwise
+            the sequence starts with a reset.
+            """
+        old: int = int(self)
+        new: int = int(other)
+        if old == new:
+            return ''
+        removed: int = old & ~new & self.EFFECT_MASK
+        for mask, mode in ((self.FG_MASK, self.FG_MODE),
+                           (self.BG_MASK, self.BG_MODE)):
+            if (old >> mode) & 3 and not (new >> mode) & 3:
+                removed |= mask
+        if removed:
+            if not new:
+                return Ansi.RESET
+            return f'{Ansi.CSI}0;{_style_params(new)}{Ansi.SUFFIX}'
+        added: int = new & ~old & self.EFFECT_MASK
+        for mask in (self.FG_MASK, self.BG_MASK):
+            if new & mask != old & mask:
+                added |= new & mask
+        return _style_sgr(added)
+
+    def __or__(self, other: int) -> 'Style':
+        base: int = int(self)
+        other = int(other)
+        if other & (3 << self.FG_MODE):
+            base &= ~self.FG_MASK
+        if other & (3 << self.BG_MODE):
+            base &= ~self.BG_MASK
+        return Style(base | other)
+
+    def __ror__(self, other: int) -> 'Style':
+        return Style(other) | self
+
+    def __and__(self, other: int) -> 'Style':
+        return Style(int(self) & int(other))
+
+    __rand__ = __and__
+
+    def __xor__(self, other: int) -> 'Style':
+        return Style(int(self) ^ int(other))
+
+    __rxor__ = __xor__
+
+    def __invert__(self) -> 'Style':
+        return Style(~int(self) & self.MASK)
+
+    def __str__(self):
+        return _style_sgr(int(self))
+
+    def __format__(self, spec: str) -> str:
+        return format(_style_sgr(int(self)), spec)
+
+    def __repr__(self):
+        value: int = int(self)
+        effects = [c for c, bit in self.EFFECT_BITS.items() if value & bit]
+        return (f'{self.__class__.__name__}(effects={effects}, '
+                f'fg={self.fg}, bg={self.bg})')
+
+
+RE_SGR = re.compile(r'\x1B\[([0-9;]*)m')
+
+# !------------------------------------------------ Visible text search
+
+
+class TextMatch(NamedTuple):
+    """ A match in both visible text and raw (colored) coordinates. """
+    start: int
+    end: int
+    raw_start: int
+    raw_end: int
+    text: str
+
+
+class VisibleText:
+    """ Colored text stripped once, with a map from visible to raw offsets.
+
+        Each run of text between escape codes is recorded by its visible
+        start, raw start and the Style in effect, in compact arrays; any
+        visible offset maps back to the raw string with one bisect.
+
+            v = VisibleText(colored)
+            for m in v.search('error'):
+                colored[m.raw_start:m.raw_end]
+            print(v.highlight('error', Ansi.REVERSE))
+
+        style - the Style already in effect where <raw> starts, for text
+                that is one piece of a longer stream; `end_style` is the
+                Style in effect after it, to pass on to the next piece
+        """
+    __slots__ = ('raw', 'text', 'end_style', '_vis', '_raw', '_style')
+
+    def __init__(self, raw: str, style: int = 0):
+        self.raw: str = raw
+        self._vis: array = array('Q')
+        self._raw: array = array('Q')
+        self._style: array = array('Q')
+        text: List[str] = []
+        style = Style(style)
+        vis: int = 0
+        pos: int = 0
+        for m in Ansi.ANSI_ESCAPE.finditer(raw):
+            if m.start() > pos:
+                self._add_run(vis, pos, style)
+                text.append(raw[pos:m.start()])
+                vis += m.start() - pos
+            sgr = RE_SGR.fullmatch(m.group())
+            if sgr:
+                style = style.apply(sgr.group(1))
+            pos = m.end()
+        if pos < len(raw) or not self._vis:
+            self._add_run(vis, pos, style)
+            text.append(raw[pos:])
+        self.text: str = ''.join(text)
+        self.end_style: Style = style
+
+    def _add_run(self, vis: int, raw: int, style: int):
+        self._vis.append(vis)
+        self._raw.append(raw)
+        self._style.append(style)
+
+    def _run(self, i: int, end: bool = False) -> int:
+        """ Index of the run holding visible offset <i>; an <end> offset
+            belongs to the run it closes, not the one after it. """
+        n = bisect_left(self._vis, i) if end else bisect_right(self._vis, i)
+        return max(n - 1, 0)
+
+    def raw_index(self, i: int, end: bool = False) -> int:
+        """ Map visible offset <i> to an offset in the raw string.
+
+            A start maps past any escape codes at that spot and an <end>
+            maps before them, so slices keep their own styles.
+            """
+        run: int = self._run(i, end)
+        return self._raw[run] + i - self._vis[run]
+
+    def style_at(self, i: int) -> Style:
+        """ Return the Style in effect at visible offset <i>. """
+        return Style(self._style[self._run(i)])
+
+    def search(self, pattern: Any, flags: int = 0,
+               regex: bool = True) -> Iterator[TextMatch]:
+        """ Yield matches of <pattern> in the visible text.
+
+            pattern - regex string or compiled pattern
+            regex   - False to match <pattern> literally
+            """
+        if not regex:
+            pattern = re.escape(pattern)
+        if isinstance(pattern, str):
+            pattern = re.compile(pattern, flags)
+        for m in pattern.finditer(self.text):
+            start, end = m.span()
+            raw_start: int = self.raw_index(start)
+            raw_end: int = (raw_start if start == end   # - empty match
+                            else self.raw_index(end, True))
+            yield TextMatch(start, end, raw_start, raw_end, m.group())
+
+    def highlight(self, pattern: Any, style: str = Ansi.REVERSE,
+                  **kwargs) -> str:
+        """ Return the raw text with <style> applied to each match.
+
+            <style> is re-applied after escape codes inside a match, and
+            after it the style that was in effect there is restored, so
+            the surrounding colors are left as they were.
+            """
+        out: List[str] = []
+        pos: int = 0
+        for m in self.search(pattern, **kwargs):
+            if m.start == m.end:
+                continue
+            inner: str = self.raw[m.raw_start:m.raw_end]
+            if Ansi.ESC in inner:   # - keep the highlight across inner codes
+                inner = RE_SGR.sub(lambda sgr: sgr.group() + style, inner)
+            restore: Style = Style(self._style[self._run(m.end, True)])
+            out += (self.raw[pos:m.raw_start], style, inner,
+                    Ansi.RESET, str(restore) if restore else '')
+            pos = m.raw_end
+        out.append(self.raw[pos:])
+        return ''.join(out)
+
+# !------------------------------------------------ Theme remapping
+
+
+_CUBE_LEVELS: Tuple[int, ...] = (0, 95, 135, 175, 215, 255)
+
+
+@lru_cache(maxsize=4096)
+def nearest_256(r: int, g: int, b: int) -> int:
+    """ Return the xterm 256 color index (16-255) closest to <r, g, b>. """
+    def level(v: int) -> int:
+        return 0 if v < 48 else 1 if v < 115 else (v - 35) // 40
+    ri, gi, bi = level(r), level(g), level(b)
+    cr, cg, cb = _CUBE_LEVELS[ri], _CUBE_LEVELS[gi], _CUBE_LEVELS[bi]
+    grey: int = min(max((r + g + b) // 3 - 3, 0) // 10, 23)
+    gv: int = 8 + 10 * grey
+    cube: int = (cr - r) ** 2 + (cg - g) ** 2 + (cb - b) ** 2
+    if cube <= (gv - r) ** 2 + (gv - g) ** 2 + (gv - b) ** 2:
+        return 16 + 36 * ri + 6 * gi + bi
+    return 232 + grey
+
+
+def _theme_color(color: Any) -> Any:
+    """ Return a palette index or (r, g, b) for <color>: an int, a tuple
+        or an `Ansi` color string. """
+    if not isinstance(color, str):
+        return color
+    style: Style = Style.parse(color)
+    mode, n = style.fg if style.fg[0] else style.bg
+    if mode == Style.RGB:
+        return (n >> 16, (n >> 8) & 0xFF, n & 0xFF)
+    if not mode:
+        raise ValueError(f'no color in {color!r}')
+    return n
+
+
+class ThemeMap:
+    """ Streaming transform that rewrites SGR colors through a table.
+
+        colors  - {old: new} where old is a palette index (0-255) or an
+                  `Ansi` color string and new is an index, an (r, g, b)
+                  tuple or an `Ansi` color string; e.g. {Ansi.RED: 160}
+        to_256  - write 16 color codes (30-37, 90-97, ...) as 38;5;n
+        nearest - map truecolor codes to the nearest palette entry (and
+                  then through <colors>)
+
+        The fg and bg replacement for all 256 palette entries is built up
+        front, and each distinct parameter string is rewritten once and
+        memoized, so a sequence costs one dict lookup. Text between
+        escapes is passed through untouched.
+
+            dark = ThemeMap({Ansi.BLUE7: Ansi.BLUE, 0: 236}, to_256=True)
+            for chunk in dark.stream(sys.stdin):
+                sys.stdout.write(chunk)
+        """
+    MEMO_SIZE: int = 4096
+    # - a lone ESC, or a CSI still waiting for its final byte
+    PARTIAL_CSI = re.compile(r'\x1B(?:\[[0-?]*[ -/]*)?\Z')
+
+    def __init__(self, colors=None, to_256: bool = False,
+                 nearest: bool = False):
+        self.nearest: bool = nearest
+        table = {_theme_color(k): _theme_color(v)
+                 for k, v in (colors or {}).items()}
+        self.fg: List[str] = []
+        self.bg: List[str] = []
+        for i in range(256):
+            new = table.get(i, i)
+            if isinstance(new, tuple):
+                self.fg.append('38;2;{};{};{}'.format(*new))
+                self.bg.append('48;2;{};{};{}'.format(*new))
+            elif new < 16 and not to_256:
+                self.fg.append(str(30 + new if new < 8 else 82 + new))
+                self.bg.append(str(40 + new if new < 8 else 92 + new))
+            else:
+                self.fg.append(f'38;5;{new}')
+                self.bg.append(f'48;5;{new}')
+        self._memo: dict = {}
+
+    def _rewrite(self, params: str) -> str:
+        out: List[str] = []
+        it = iter([int(p) if p else 0 for p in params.split(Ansi.ANSI_SEP)])
+        for p in it:
+            if 30 <= p <= 37 or 90 <= p <= 97:
+                out.append(self.fg[p - 30 if p < 90 else p - 82])
+            elif 40 <= p <= 47 or 100 <= p <= 107:
+                out.append(self.bg[p - 40 if p < 100 else p - 92])
+            elif p == 38 or p == 48:
+                table = self.fg if p == 38 else self.bg
+                kind = next(it, None)
+                if kind == 5:
+                    out.append(table[next(it, 0) & 0xFF])
+                elif kind == 2:
+                    rgb = (next(it, 0), next(it, 0), next(it, 0))
+                    if self.nearest:
+                        out.append(table[nearest_256(*rgb)])
+                    else:
+                        out.append(f'{p};2;{rgb[0]};{rgb[1]};{rgb[2]}')
+                else:
+                    out.append(str(p) if kind is None else f'{p};{kind}')
+            else:
+                out.append(str(p))
+        return Ansi.ANSI_SEP.join(out)
+
+    def _replace(self, m) -> str:
+        params: str = m.group(1)
+        try:
+            return self._memo[params]
+        except KeyError:
+            if len(self._memo) >= self.MEMO_SIZE:
+                self._memo.clear()
+            s = f'{Ansi.CSI}{self._rewrite(params)}{Ansi.SUFFIX}'
+            self._memo[params] = s
+            return s
+
+    def sub(self, text: str) -> str:
+        """ Return <text> with its SGR colors remapped. """
+        return RE_SGR.sub(self._replace, text) if Ansi.ESC in text else text
+
+    def stream(self, chunks: Iterable[str]) -> Iterator[str]:
+        """ Remap an iterable of text chunks (lines, reads from a pipe).
+
+            A control sequence split across two chunks is held back until
+            the rest of it arrives; complete escapes are never held.
+            """
+        tail: str = ''
+        for chunk in chunks:
+            if tail:
+                chunk, tail = tail + chunk, ''
+            esc: int = chunk.rfind(Ansi.ESC)
+            if esc >= 0 and len(chunk) - esc < 64 \
+                    and self.PARTIAL_CSI.match(chunk, esc):
+                chunk, tail = chunk[:esc], chunk[esc:]
+            if chunk:
+                yield self.sub(chunk)
+        if tail:
+            yield self.sub(tail)
+
+    def pipe(self, infile=None, outfile=None):
+        """ Copy <infile> (default: stdin) to <outfile> (default: stdout)
+            a line at a time, remapping colors as they pass. """
+        infile = sys.stdin if infile is None else infile
+        outfile = stdout if outfile is None else outfile
+        for chunk in self.stream(iter(infile.readline, '')):
+            outfile.write(chunk)
+            outfile.flush()
+
+# !------------------------------------------------ PTY runner
+
+
+def _write_all(fd: int, data: bytes):
+    while data:
+        data = data[os.write(fd, data):]
+
+
+def _exit_code(status: int) -> int:
+    if os.WIFSIGNALED(status):
+        return 128 + os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def run(argv: Sequence[str], colorize=None, pattern: Any = None,
+        style: str = Ansi.REVERSE, chunk_size: int = 65536,
+        linger: float = 0.05) -> int:
+    """ Run <argv> under a pseudo-terminal and restyle its output live.
+
+        The child sees a tty, so it keeps its own color detection. Output
+        is read in chunks of up to <chunk_size> bytes as soon as it is
+        available; complete lines go through <colorize> at once and a
+        trailing partial line waits at most <linger> seconds for the rest.
+        Window size changes (SIGWINCH) are passed on to the child and our
+        stdin is forwarded in raw mode. Returns the child's exit status.
+
+        colorize - callable str -> str applied to the output (e.g.
+                   ThemeMap(...).sub); default: pass output through
+        pattern  - highlight matches with <style> (see VisibleText); the
+                   child's own style is carried from chunk to chunk and
+                   restored after each match
+        """
+    try:
+        import fcntl
+        import pty
+        import termios
+        import tty
+    except ImportError:
+        raise OSError('run() needs a POSIX pseudo-terminal') from None
+    import codecs
+    import selectors
+    import signal
+
+    if colorize is None and pattern is not None:
+        state: Style = Style()
+
+        def colorize(s: str) -> str:
+            nonlocal state
+            text = VisibleText(s, state)
+            state = text.end_style
+            return text.highlight(pattern, style)
+
+    stdout.flush()
+    pid, master = pty.fork()
+    if pid == 0:  # - child
+        try:
+            os.execvp(argv[0], list(argv))
+        except OSError as e:
+            os.write(2, f'anansi: {argv[0]}: {e.strerror}\n'.encode())
+        os._exit(127)
+
+    try:
+        in_fd: int = sys.stdin.fileno()
+    except (AttributeError, OSError, ValueError):  # - no stdin to forward
+        in_fd = -1
+    out_fd: int = stdout.fileno()
+
+    def resize(*_):
+        try:
+            fcntl.ioctl(master, termios.TIOCSWINSZ,
+                        fcntl.ioctl(out_fd, termios.TIOCGWINSZ, b'\0' * 8))
+        except OSError:
+            pass
+
+    resize()
+    old_winch = signal.signal(signal.SIGWINCH, resize)
+    saved_tty = None
+    if in_fd >= 0 and os.isatty(in_fd):
+        saved_tty = termios.tcgetattr(in_fd)
+        tty.setraw(in_fd)
+    sel = selectors.DefaultSelector()
+    sel.register(master, selectors.EVENT_READ)
+    try:
+        if in_fd >= 0:
+            sel.register(in_fd, selectors.EVENT_READ)
+    except (OSError, ValueError):  # - regular files can't be polled
+        pass
+    decode = codecs.getincrementaldecoder('utf-8')('replace').decode
+    pending: str = ''
+    try:
+        while True:
+            events = sel.select(linger if pending else None)
+            if not events:
+                _write_all(out_fd, colorize(pending).encode())
+                pending = ''
+                continue
+            for key, _ in events:
+                if key.fd == in_fd:
+                    data = os.read(in_fd, chunk_size)
+                    if data:
+                        _write_all(master, data)
+                    else:  # - stdin closed: pass on EOF
+                        sel.unregister(in_fd)
+                        _write_all(master, b'\x04')
+                    continue
+                try:
+                    data = os.read(master, chunk_size)
+                except OSError:  # - EIO once the child is gone
+                    data = b''
+                if not data:
+                    raise EOFError
+                if colorize is None:
+                    _write_all(out_fd, data)
+                    continue
+                text: str = pending + decode(data)
+                cut: int = text.rfind('\n') + 1
+                pending = text[cut:]
+                if cut:
+                    _write_all(out_fd, colorize(text[:cut]).encode())
+    except EOFError:
+        pass
+    finally:
+        if colorize is not None:
+            pending += decode(b'', True)  # - trailing partial UTF-8
+        if pending:
+            _write_all(out_fd, colorize(pending).encode())
+        sel.close()
+        os.close(master)
+        signal.signal(signal.SIGWINCH, old_winch)
+        if saved_tty is not None:
+            termios.tcsetattr(in_fd, termios.TCSAFLUSH, saved_tty)
+    return _exit_code(os.waitpid(pid, 0)[1])
+
+
+def _run_cli(args: List[str]) -> int:
+    """ anansi run [-P PATTERN] [--] COMMAND [ARGS ...] """
+    pattern = None
+    while len(args) > 1 and args[0] in _VALUE_OPTIONS:
+        pattern, args = args[1], args[2:]
+    if args[:1] == ['--']:
+        args = args[1:]
+    elif args[:1] and args[0] in _VALUE_OPTIONS:  # - option with no value
+        args = []
+    if not args:
+        print('usage: anansi run [-P PATTERN] [--] COMMAND [ARGS ...]',
+              file=stderr)
+        return 2
+    return run(args, pattern=pattern)
+
+# !------------------------------------------------ Diff
+
+
+class LineIndex:
+    """ Read only sequence of the lines of a (large) file.
+
+        Only the byte offset of each line is kept, in an array, and lines
+        are read back on demand, so millions of lines cost 8 bytes each.
+        """
+
+    def __init__(self, path: str, encoding: str = 'utf-8'):
+        self.encoding: str = encoding
+        self._file = open(path, 'rb')
+        self._offsets: array = array('Q')
+        pos: int = 0
+        for line in self._file:
+            self._offsets.append(pos)
+            pos += len(line)
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __getitem__(self, i: int) -> str:
+        self._file.seek(self._offsets[i])
+        return self._file.readline().decode(self.encoding, 'replace')
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _visible_line(line: str) -> str:
+    if Ansi.ESC in line or '\x9B' in line:
+        line = Ansi.ANSI_ESCAPE.sub('', line)
+    return line.rstrip('\r\n')
+
+
+def _middle_snake(a: array, a0: int, a1: int, b: array, b0: int,
+                  b1: int) -> Tuple[int, int, int, int]:
+    """ Myers' middle snake of a[a0:a1] and b[b0:b1], in local coordinates. """
+    n: int = a1 - a0
+    m: int = b1 - b0
+    delta: int = n - m
+    odd: int = delta & 1
+    dmax: int = (n + m + 1) // 2
+    off: int = dmax + 1
+    vf: List[int] = [0] * (2 * off + 1)
+    vb: List[int] = [0] * (2 * off + 1)
+    for d in range(dmax + 1):
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and vf[off + k - 1] < vf[off + k + 1]):
+                x = vf[off + k + 1]
+            else:
+                x = vf[off + k - 1] + 1
+            y = x - k
+            xs, ys = x, y
+            while x < n and y < m and a[a0 + x] == b[b0 + y]:
+                x += 1
+                y += 1
+            vf[off + k] = x
+            if (odd and delta - d < k < delta + d
+                    and x + vb[off + delta - k] >= n):
+                return xs, ys, x, y
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and vb[off + k - 1] < vb[off + k + 1]):
+                x = vb[off + k + 1]
+            else:
+                x = vb[off + k - 1] + 1
+            y = x - k
+            xs, ys = x, y
+            while x < n and y < m and a[a1 - 1 - x] == b[b1 - 1 - y]:
+                x += 1
+                y += 1
+            vb[off + k] = x
+            if (not odd and -d <= delta - k <= d
+                    and x + vf[off + delta - k] >= n):
+                return n - x, m - y, n - xs, m - ys
+    return 0, 0, 0, 0  # - not reached
+
+
+def _matches(a: array, b: array, a0: int = 0, a1: Any = None, b0: int = 0,
+             b1: Any = None) -> Iterator[Tuple[int, int, int]]:
+    """ Yield (i, j, size) runs of equal items of a[a0:a1] and b[b0:b1] in
+        order, using linear space Myers; each run is yielded as soon as
+        everything before it is known, so common prefixes come out at
+        once. Costs O((N + M) * D) time for D differences. """
+    a1 = len(a) if a1 is None else a1
+    b1 = len(b) if b1 is None else b1
+    stack: List[Tuple[int, ...]] = [(a0, a1, b0, b1)]
+    while stack:
+        item = stack.pop()
+        if len(item) == 3:
+            yield item  # type: ignore
+            continue
+        a0, a1, b0, b1 = item
+        i: int = 0
+        while a0 + i < a1 and b0 + i < b1 and a[a0 + i] == b[b0 + i]:
+            i += 1
+        if i:
+            yield a0, b0, i
+            a0, b0 = a0 + i, b0 + i
+        j: int = 0
+        while (a0 < a1 - j and b0 < b1 - j
+               and a[a1 - 1 - j] == b[b1 - 1 - j]):
+            j += 1
+        if j:
+            stack.append((a1 - j, b1 - j, j))
+            a1, b1 = a1 - j, b1 - j
+        if a0 == a1 or b0 == b1:
+            continue
+        x, y, u, v = _middle_snake(a, a0, a1, b, b0, b1)
+        stack.append((a0 + u, a1, b0 + v, b1))
+        if u > x:
+            stack.append((a0 + x, b0 + y, u - x))
+        stack.append((a0, a0 + x, b0, b0 + y))
+
+
+def _unique_anchors(a: array, a0: int, a1: int, b: array, b0: int,
+                    b1: int) -> List[Tuple[int, int]]:
+    """ Return (i, j) pairs of items found exactly once in a[a0:a1] and
+        once in b[b0:b1], keeping the longest chain that is in the same
+        order in both (patience diff). """
+    once: dict = {}     # - item -> index in a, or -1 if repeated
+    for i in range(a0, a1):
+        once[a[i]] = -1 if a[i] in once else i
+    pairs: dict = {}    # - item -> index in b, or -1 if repeated
+    for j in range(b0, b1):
+        if once.get(b[j], -1) >= 0:
+            pairs[b[j]] = -1 if b[j] in pairs else j
+    found = sorted((once[h], j) for h, j in pairs.items() if j >= 0)
+    # - longest increasing run of j, by patience sorting
+    tops: List[int] = []        # - smallest j ending a chain of each length
+    top_at: List[int] = []      # - index in <found> of that j
+    prev: List[int] = []
+    for k, (i, j) in enumerate(found):
+        n: int = bisect_left(tops, j)
+        if n == len(tops):
+            tops.append(j)
+            top_at.append(k)
+        else:
+            tops[n] = j
+            top_at[n] = k
+        prev.append(top_at[n - 1] if n else -1)
+    picked: List[Tuple[int, int]] = []
+    k = top_at[-1] if top_at else -1
+    while k >= 0:
+        picked.append(found[k])
+        k = prev[k]
+    picked.reverse()
+    return picked
+
+
+def _joined(runs: Iterable[Tuple[int, int, int]]
+            ) -> Iterator[Tuple[int, int, int]]:
+    """ Merge (i, j, size) runs that follow on from each other. """
+    last: Any = None
+    for i, j, size in runs:
+        if last and last[0] + last[2] == i and last[1] + last[2] == j:
+            last = (last[0], last[1], last[2] + size)
+            continue
+        if last:
+            yield last
+        last = (i, j, size)
+    if last:
+        yield last
+
+
+def _patience_matches(a: array, b: array) -> Iterator[Tuple[int, int, int]]:
+    """ Yield (i, j, size) runs of equal items in order.
+
+        Common prefixes and suffixes are split off first and yielded at
+        once. The rest is split on the items that are unique in both
+        ranges, and only the gaps between those anchors, which hold no
+        shared unique line, go to Myers (`_matches`), so the Myers cost
+        grows with the size of each gap rather than of the whole input.
+        """
+    stack: List[Tuple[int, ...]] = [(0, len(a), 0, len(b))]
+    while stack:
+        item = stack.pop()
+        if len(item) == 3:
+            yield item  # type: ignore
+            continue
+        a0, a1, b0, b1 = item
+        i: int = 0
+        while a0 + i < a1 and b0 + i < b1 and a[a0 + i] == b[b0 + i]:
+            i += 1
+        if i:
+            yield a0, b0, i
+            a0, b0 = a0 + i, b0 + i
+        j: int = 0
+        while (a0 < a1 - j and b0 < b1 - j
+               and a[a1 - 1 - j] == b[b1 - 1 - j]):
+            j += 1
+        if j:
+            stack.append((a1 - j, b1 - j, j))
+            a1, b1 = a1 - j, b1 - j
+        if a0 == a1 or b0 == b1:
+            continue
+        anchors = _unique_anchors(a, a0, a1, b, b0, b1)
+        if not anchors:
+            yield from _matches(a, b, a0, a1, b0, b1)
+            continue
+        for i, j in reversed(anchors):
+            stack.append((i + 1, a1, j + 1, b1))
+            stack.append((i, j, 1))
+            a1, b1 = i, j
+        stack.append((a0, a1, b0, b1))
+
+
+Opcode = Tuple[str, int, int, int, int]
+
+
+def diff_opcodes(a: Sequence[str], b: Sequence[str]) -> Iterator[Opcode]:
+    """ Yield difflib style opcodes comparing the visible text of lines.
+
+        Lines are reduced to 64 bit hashes of their visible text, so two
+        int arrays are held while diffing, plus a dict of the hashes in the
+        range being split on unique lines (see `_patience_matches`).
+        """
+    ha: array = array('q', (hash(_visible_line(line)) for line in a))
+    hb: array = array('q', (hash(_visible_line(line)) for line in b))
+    i: int = 0
+    j: int = 0
+    end = ((len(ha), len(hb), 0),)
+    for i1, j1, size in chain(_joined(_patience_matches(ha, hb)), end):
+        if i < i1 and j < j1:
+            yield 'replace', i, i1, j, j1
+        elif i < i1:
+            yield 'delete', i, i1, j, j1
+        elif j < j1:
+            yield 'insert', i, i1, j, j1
+        if size:
+            yield 'equal', i1, i1 + size, j1, j1 + size
+        i, j = i1 + size, j1 + size
+
+
+def _hunks(opcodes: Iterable[Opcode], n: int) -> Iterator[List[Opcode]]:
+    """ Group opcodes into hunks with <n> lines of context. """
+    group: List[Opcode] = []
+    lead = None
+    for op in opcodes:
+        tag, i1, i2, j1, j2 = op
+        if tag == 'equal':
+            if group and i2 - i1 > 2 * n:
+                group.append(('equal', i1, i1 + n, j1, j1 + n))
+                yield group
+                group = []
+            if not group:
+                lead = ('equal', max(i1, i2 - n), i2, max(j1, j2 - n), j2)
+                continue
+        elif not group and lead:
+            group.append(lead)
+        group.append(op)
+    if group:
+        tag, i1, i2, j1, j2 = group[-1]
+        if tag == 'equal':
+            group[-1] = ('equal', i1, min(i2, i1 + n),
+                         j1, min(j2, j1 + n))
+        yield group
+
+
+DIFF_DELETE: str = Ansi.CHERRY
+DIFF_INSERT: str = Ansi.GO
+DIFF_HUNK: str = Ansi.WARN
+DIFF_MARK: str = Ansi.BOLD + Ansi.REVERSE
+DIFF_INTRALINE_MAX: int = 2000      # - longer lines skip intra-line marks
+
+
+def _intraline(old: str, new: str, color: bool) -> Tuple[str, str]:
+    """ Return <old> and <new> styled, with changed characters marked. """
+    if not color:
+        return old, new
+    if len(old) + len(new) > DIFF_INTRALINE_MAX:
+        return (f'{DIFF_DELETE}{old}{Ansi.RESET}',
+                f'{DIFF_INSERT}{new}{Ansi.RESET}')
+    from difflib import SequenceMatcher
+
+    olds: List[str] = [DIFF_DELETE]
+    news: List[str] = [DIFF_INSERT]
+    matcher = SequenceMatcher(None, old, new, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            olds.append(old[i1:i2])
+            news.append(new[j1:j2])
+            continue
+        if i2 > i1:
+            olds += (DIFF_MARK, old[i1:i2], Ansi.RESET, DIFF_DELETE)
+        if j2 > j1:
+            news += (DIFF_MARK, new[j1:j2], Ansi.RESET, DIFF_INSERT)
+    olds.append(Ansi.RESET)
+    news.append(Ansi.RESET)
+    return ''.join(olds), ''.join(news)
+
+
+def _hunk_range(start: int, stop: int) -> str:
+    """ Format a hunk header range the way difflib does: an empty range
+        names the line before it, and a length of 1 is left out. """
+    length: int = stop - start
+    if length == 1:
+        return str(start + 1)
+    return f'{start + 1 if length else start},{length}'
+
+
+def unified_diff(a: Sequence[str], b: Sequence[str], fromfile: str = 'a',
+                 tofile: str = 'b', n: int = 3,
+                 color: bool = True) -> Iterator[str]:
+    """ Yield a colored unified diff of the visible text of <a> and <b>.
+
+        a, b - sequences of lines, e.g. lists or LineIndex for big files
+
+        Each hunk is written once its end is known; changed line pairs get
+        intra-line marks.
+        """
+    def styled(style: str, s: str) -> str:
+        return f'{style}{s}{Ansi.RESET}' if color else s
+
+    for h, group in enumerate(_hunks(diff_opcodes(a, b), n)):
+        if not h:   # - like diff, say nothing when the inputs match
+            yield styled(Ansi.BOLD, f'--- {fromfile}')
+            yield styled(Ansi.BOLD, f'+++ {tofile}')
+        i1, i2, j1, j2 = group[0][1], group[-1][2], group[0][3], group[-1][4]
+        header = f'@@ -{_hunk_range(i1, i2)} +{_hunk_range(j1, j2)} @@'
+        yield styled(DIFF_HUNK, header)
+        for tag, i1, i2, j1, j2 in group:
+            if tag == 'equal':
+                for i in range(i1, i2):
+                    yield f' {_visible_line(a[i])}'
+                continue
+            pairs: int = min(i2 - i1, j2 - j1) if tag == 'replace' else 0
+            new_lines: List[str] = []
+            for k in range(pairs):
+                old, new = _intraline(_visible_line(a[i1 + k]),
+                                      _visible_line(b[j1 + k]), color)
+                yield styled(DIFF_DELETE, '-') + old
+                new_lines.append(styled(DIFF_INSERT, '+') + new)
+            for i in range(i1 + pairs, i2):
+                yield styled(DIFF_DELETE, f'-{_visible_line(a[i])}')
+            yield from new_lines
+            for j in range(j1 + pairs, j2):
+                yield styled(DIFF_INSERT, f'+{_visible_line(b[j])}')
+
+
+def _fit(s: str, width: int) -> str:
+    """ Truncate or pad <s> to <width> columns.
+
+        Escape codes are kept even past the cut, so a trailing reset still
+        ends any style that was open where the text was truncated.
+        """
+    if s.isascii() and Ansi.ESC not in s:
+        return s[:width].ljust(width)
+    out: List[str] = []
+    w: int = 0
+    pos: int = 0
+    cut: bool = False
+    for m in chain(Ansi.ANSI_ESCAPE.finditer(s), (None,)):
+        for c in '' if cut else s[pos:m.start() if m else len(s)]:
+            cw: int = 2 if east_asian_width(c) in 'WF' else 1
+            if w + cw > width:
+                cut = True
+                break
+            out.append(c)
+            w += cw
+        if m:
+            out.append(m.group())
+            pos = m.end()
+    return ''.join(out) + ' ' * (width - w)
+
+
+def side_by_side(a: Sequence[str], b: Sequence[str], width: int = 0,
+                 n: Any = None, color: bool = True) -> Iterator[str]:
+    """ Yield a colored two column diff of the visible text of <a> and <b>.
+
+        width - total columns (default: terminal width)
+        n     - lines of context around changes; None shows every line
+
+        Lines are written as each opcode arrives, so output starts with the
+        first difference found. Intra-line marks are found on whole lines
+        before they are cut to the column width.
+        """
+    if not width:
+        width = os.get_terminal_size().columns if is_a_tty() else _WIDTH
+    col: int = max((width - 3) // 2, 1)
+    blank: str = ' ' * col
+    sep: str = '-' * width
+    ops = diff_opcodes(a, b)
+    groups = [ops] if n is None else _hunks(ops, n)
+
+    def row(left: str, mark: str, right: str) -> str:
+        return f'{left} {mark} {right}'.rstrip()
+
+    for g, group in enumerate(groups):
+        if n is not None and g:
+            yield f'{DIFF_HUNK}{sep}{Ansi.RESET}' if color else sep
+        for tag, i1, i2, j1, j2 in group:
+            if tag == 'equal':
+                for i, j in zip(range(i1, i2), range(j1, j2)):
+                    yield row(_fit(_visible_line(a[i]), col), ' ',
+                              _fit(_visible_line(b[j]), col))
+                continue
+            for k in range(max(i2 - i1, j2 - j1)):
+                old = _visible_line(a[i1 + k]) if i1 + k < i2 else None
+                new = _visible_line(b[j1 + k]) if j1 + k < j2 else None
+                if old is not None and new is not None:
+                    left, right = _intraline(old, new, color)
+                    yield row(_fit(left, col), '|', _fit(right, col))
+                elif old is not None:
+                    old = _fit(old, col)
+                    if color:
+                        old = f'{DIFF_DELETE}{old}{Ansi.RESET}'
+                    yield row(old, '<', '')
+                else:
+                    new = _fit(new, col)
+                    if color:
+                        new = f'{DIFF_INSERT}{new}{Ansi.RESET}'
+                    yield row(blank, '>', new)
+
+# !------------------------------------------------ JSONL export
+
+
+@lru_cache(maxsize=4096)
+def _span_json(value: int) -> str:
+    """ Return the pre-encoded `fg,bg,[effects]` JSON fragment for a Style. """
+    style: Style = Style(value)
+    fields: List[str] = []
+    for mode, n in (style.fg, style.bg):
+        if mode == Style.RGB:
+            fields.append(f'"#{n:06x}"')
+        else:
+            fields.append(str(n) if mode else 'null')
+    effects: str = ','.join(str(c) for c, bit in Style.EFFECT_BITS.items()
+                            if value & bit)
+    return f'{fields[0]},{fields[1]},[{effects}]'
+
+
+def export_spans(lines: Iterable[str]) -> Iterator[str]:
+    """ Yield one JSON record per line of colored text:
+
+            {"text": "plain text",
+             "spans": [[start, end, fg, bg, [effects]], ...]}
+
+        fg and bg are null (default), a palette index (0-255) or '#rrggbb';
+        effects are SGR codes (1 bold, 4 underline, ...). Only styled runs
+        get spans, and a style left open at the end of a line carries on
+        to the next, as on a terminal. The text is the only thing encoded
+        per record; style changes and each style's JSON are worked out once
+        and reused. Uses ujson when it is installed.
+        """
+    dumps = json.dumps
+    style: Style = Style()
+    seen: dict = {}     # - (style, params) -> style
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if Ansi.ESC not in line and '\x9B' not in line:
+            span: str = ''
+            if style and line:
+                span = f'[0,{len(line)},{_span_json(int(style))}]'
+            yield f'{{"text":{dumps(line)},"spans":[{span}]}}'
+            continue
+        text: List[str] = []
+        spans: List[str] = []
+        vis: int = 0
+        pos: int = 0
+        for m in chain(Ansi.ANSI_ESCAPE.finditer(line), (None,)):
+            end: int = m.start() if m else len(line)
+            if end > pos:
+                run: str = line[pos:end]
+                text.append(run)
+                if style:
+                    fields: str = _span_json(int(style))
+                    spans.append(f'[{vis},{vis + len(run)},{fields}]')
+                vis += len(run)
+            if m is None:
+                break
+            sgr = RE_SGR.fullmatch(m.group())
+            if sgr:
+                key = (style, sgr.group(1))
+                try:
+                    style = seen[key]
+                except KeyError:
+                    if len(seen) > 4096:
+                        seen.clear()
+                    style = seen[key] = style.apply(key[1])
+            pos = m.end()
+        yield f'{{"text":{dumps("".join(text))},"spans":[{",".join(spans)}]}}'
+
+
+def write_spans(infile=None, outfile=None):
+    """ Stream colored <infile> (default: stdin) to JSONL <outfile>
+        (default: stdout); see `export_spans`. """
+    infile = sys.stdin if infile is None else infile
+    outfile = stdout if outfile is None else outfile
+    outfile.writelines(f'{record}\n' for record in export_spans(infile))
+
+# !------------------------------------------------ asyncio output
+
+
+class _PipeProtocol:
+    """ Flow control state for AsyncWriter's pipe transport.
+
+        asyncio only calls the protocol methods, so this need not subclass
+        asyncio.Protocol, and asyncio is not imported until a writer starts.
+        """
+
+    def __init__(self):
+        import asyncio
+
+        self.resume = asyncio.Event()
+        self.resume.set()
+        self.lost: Any = None
+
+    def connection_made(self, transport):
+        pass
+
+    def pause_writing(self):
+        self.resume.clear()
+
+    def resume_writing(self):
+        self.resume.set()
+
+    def connection_lost(self, exc):
+        self.lost = exc or BrokenPipeError('output closed')
+        self.resume.set()
+
+
+class AsyncWriter:
+    """ Non-blocking terminal writer for coroutines.
+
+        Writes go through an asyncio pipe transport on a duplicate of the
+        file's descriptor, so a slow terminal or pipe never blocks the
+        event loop. Strings written in the same loop tick are coalesced
+        into one transport write. `await write()` returns at once until
+        more than <high> bytes are waiting and then until they drop below
+        <low>; `write_nowait()` only queues.
+
+            async with AsyncWriter() as out:
+                await out.clear()
+                await out.write(f"{Ansi.GO}ready{Ansi.RESET}\n")
+
+        The descriptor is non-blocking while the writer is open. Regular
+        files can't use a pipe transport and are written directly.
+
+        file      - output stream (default: stdout)
+        high, low - backpressure water marks in bytes
+        """
+
+    def __init__(self, file=None, high: int = 64 * 1024, low: int = 16 * 1024):
+        self.file = stdout if file is None else file
+        self.high: int = high
+        self.low: int = low
+        self.color: bool = hasattr(self.file, 'isatty') and self.file.isatty()
+        self._transport: Any = None
+        self._protocol: Any = None
+        self._pending: List[str] = []
+        self._size: int = 0
+        self._scheduled: bool = False
+        self._loop: Any = None
+
+    async def start(self):
+        """ Connect the transport; called by `async with`. """
+        import asyncio
+
+        self._loop = asyncio.get_running_loop()
+        self.file.flush()
+        try:
+            fd: int = self.file.fileno()
+            pipe = os.fdopen(os.dup(fd), 'wb', buffering=0)
+        except (AttributeError, OSError, ValueError):  # - no real fd
+            return self
+        try:
+            self._transport, self._protocol = \
+                await self._loop.connect_write_pipe(_PipeProtocol, pipe)
+        except (OSError, ValueError):  # - regular file
+            pipe.close()
+            return self
+        self._transport.set_write_buffer_limits(self.high, self.low)
+        return self
+
+    def write_nowait(self, s: str):
+        """ Queue <s> for the next coalesced write.
+
+            Without `start()` the writer uses the running loop and writes
+            to the file directly; outside a loop this raises RuntimeError.
+            """
+        if self._loop is None:
+            import asyncio
+
+            self._loop = asyncio.get_running_loop()
+        self._pending.append(s)
+        self._size += len(s)
+        if not self._scheduled:
+            self._scheduled = True
+            self._loop.call_soon(self._flush)
+
+    async def write(self, s: str):
+        """ Queue <s>; wait only while the output is over the high mark. """
+        self.write_nowait(s)
+        if self._transport is None:
+            return
+        if self._size + self._transport.get_write_buffer_size() > self.high \
+                or not self._protocol.resume.is_set():
+            await self.drain()
+
+    async def drain(self):
+        """ Write what is queued and wait until the output is below <low>. """
+        self._flush()
+        if self._protocol is not None:
+            await self._protocol.resume.wait()
+            if self._protocol.lost:
+                raise self._protocol.lost
+
+    def _flush(self):
+        self._scheduled = False
+        if not self._pending:
+            return
+        data: str = ''.join(self._pending)
+        self._pending.clear()
+        self._size = 0
+        if self._transport is None:
+            self.file.write(data)
+            self.file.flush()
+        elif not self._transport.is_closing():
+            self._transport.write(data.encode())
+
+    async def close(self):
+        """ Write everything queued, then close the transport. """
+        await self.drain()
+        if self._transport is not None:
+            if self._transport.get_write_buffer_size():
+                self._transport.set_write_buffer_limits(0)
+                await self.drain()
+            self._transport.close()
+            self._transport = None
+            try:
+                os.set_blocking(self.file.fileno(), True)
+            except (AttributeError, OSError, ValueError):
+                pass
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    # - async versions of the Ansi cursor controls
+
+    async def _control(self, code: str):
+        if self.color:
+            await self.write(code)
+
+    async def move_to(self, L: int, C: int):
+        """ Put the cursor at line L and column C. """
+        await self._control(f'{Ansi.CSI}{L};{C}H')
+
+    async def up(self, n: int = 1):
+        await self._control(f'{Ansi.CSI}{n}A')
+
+    async def down(self, n: int = 1):
+        await self._control(f'{Ansi.CSI}{n}B')
+
+    async def right(self, n: int = 1):
+        await self._control(f'{Ansi.CSI}{n}C')
+
+    async def left(self, n: int = 1):
+        await self._control(f'{Ansi.CSI}{n}D')
+
+    async def clear(self):
+        """ Clear the screen and move to (1, 1). """
+        await self._control(f'{Ansi.CSI}2J{Ansi.CSI}H')
+
+    async def eol(self):
+        """ Erase to end of line. """
+        await self._control(f'{Ansi.CSI}K')
+
+    async def save_cursor(self):
+        await self._control(f'{Ansi.CSI}s')
+
+    async def restore_cursor(self):
+        await self._control(f'{Ansi.CSI}u')
+
 # !------------------------ debugging
 
 
@@ -628,10 +2537,16 @@ def _test_(args):
     dbprint(f'{a.fg.cache_info()=}')
 
 
-def _opts(args):
+_VALUE_OPTIONS = ('-P', '--pattern')  # - options followed by a value
+
+
+def _opts(args) -> int:
+    """ Handle options and print TEMPLATE arguments; return the exit
+        status, 1 if a template field had no value. """
+    status: int = 0
     if len(args) > 0:
         if args[0] == '--debug':
-            _SET_DEBUG = True
+            db.set_level('debug')
             _test_(args)
         if args[0] == '--version':
             print(f"{Ansi.MAIN}ansi.py{Ansi.RESET} version {__version__}.")
@@ -639,27 +2554,36 @@ def _opts(args):
         if args[0] == '--help':
             print(__doc__)
             # sys.exit(0)
-        for arg in args:
-            arg.upper()
-            # print(Ansi(f"{arg}"))
+        values = iter(args)
+        for arg in values:
+            if arg in _VALUE_OPTIONS:
+                next(values, None)  # - skip the option's value
+            elif not arg.startswith('-'):
+                try:
+                    print(render_template(arg, **environ))
+                except (IndexError, KeyError) as e:
+                    print(f'anansi: no value for template field {e}',
+                          file=stderr)
+                    status = 1
+    return status
 
 
 def main(args):
     """ main loop - test ansi cli functions """
-    _opts(args)
-    _test_(args)
+    if args and args[0] == 'run':
+        return _run_cli(args[1:])
+    return _opts(args)
 
 
 if __name__ == "__main__":
     """ cli version """
     if len(sys.argv) > 1:
         args = sys.argv[1:]
-
-    if _SET_DEBUG:  # ! use test_args to override sys.argv for testing
+    else:  # ! use test_args when no arguments are given
         test_args: List[str] = ['this is a test', '--debug', '--version']
         args = test_args
 
-    main(args)
+    sys.exit(main(args))
 
 
 """ # ########################################## TODO: Ideas and additions:
@@ -0,0 +1,48 @@
+import asyncio
+import io
+import os
+import threading
+
+import pytest
+
+from anansi import *
+
+
+def test_write_nowait_without_start_uses_running_loop():
+    out = io.StringIO()
+
+    async def main():
+        w = AsyncWriter(out)
+        w.write_nowait('a')
+        await w.write('b')
+        await asyncio.sleep(0)
+        return out.getvalue()
+
+    assert asyncio.run(main()) == 'ab'
+
+
+def test_write_nowait_outside_loop_is_a_clear_error():
+    with pytest.raises(RuntimeError):
+        AsyncWriter(io.StringIO()).write_nowait('x')
+
+
+def _read_all(fd, into):
+    into.append(b''.join(iter(lambda: os.read(fd, 4096), b'')))
+
+
+def test_pipe_output_is_coalesced_and_complete():
+    r, w = os.pipe()
+    chunks = []
+    reader = threading.Thread(target=_read_all, args=(r, chunks))
+    reader.start()
+
+    async def main():
+        with os.fdopen(w, 'w') as f:
+            async with AsyncWriter(f, high=1024, low=256) as out:
+                for i in range(2000):
+                    await out.write(f'{i}\n')
+
+    asyncio.run(main())
+    reader.join(10)
+    os.close(r)
+    assert chunks[0].split() == [str(i).encode() for i in range(2000)]
@@ -0,0 +1,46 @@
+import io
+import threading
+
+from anansi import *
+
+
+def test_records_arrive_whole():
+    out = io.StringIO()
+    with BatchWriter(out, batch=100) as w:
+        def produce(k):
+            for i in range(2000):
+                w.print('thread', k, 'line', i)
+        threads = [threading.Thread(target=produce, args=(k,))
+                   for k in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    lines = out.getvalue().splitlines()
+    assert len(lines) == 16000
+    assert all(len(line.split()) == 4 for line in lines)
+    for k in range(8):
+        mine = [int(x.split()[3]) for x in lines if x.split()[1] == str(k)]
+        assert mine == list(range(2000))
+
+
+def test_put_after_close_raises():
+    w = BatchWriter(io.StringIO())
+    w.close()
+    try:
+        w.put('late\n')
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('expected ValueError')
+
+
+def test_write_errors_do_not_kill_the_writer(capsys):
+    out = io.StringIO()
+    with BatchWriter(out, interval=0.01) as w:
+        w.put(42)        # - not a str: the batch is dropped and reported
+        w.flush()
+        threading.Event().wait(0.1)
+        w.put('ok\n')
+    assert out.getvalue() == 'ok\n'
+    assert 'dropped' in capsys.readouterr().err
@@ -0,0 +1,25 @@
+import io
+
+import anansi
+from anansi import *
+
+
+def test_levels_and_deferred_formatting():
+    out = io.StringIO()
+    ch = DebugChannel('info', file=out)
+    calls = []
+    ch.debug(lambda: calls.append(1))
+    ch.info('row %d', 3)
+    assert not calls
+    assert 'row 3' in out.getvalue()
+    ch.set_level('')
+    assert not ch.on and ch.info is ch.trace
+
+
+def test_dbprint_follows_channel(monkeypatch):
+    monkeypatch.setattr(anansi, 'db', DebugChannel(''))
+    out = io.StringIO()
+    dbprint('hidden', file=out)
+    anansi.db.set_level('debug')
+    dbprint('shown', file=out)
+    assert 'hidden' not in out.getvalue() and 'shown' in out.getvalue()
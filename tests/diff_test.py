@@ -0,0 +1,131 @@
+import difflib
+import random
+import time
+from array import array
+
+from anansi import *
+import anansi
+from anansi import _matches, _patience_matches
+
+
+def _lcs(a, b):
+    row = [0] * (len(b) + 1)
+    for x in a:
+        prev = 0
+        for j, y in enumerate(b):
+            prev, row[j + 1] = row[j + 1], (prev + 1 if x == y
+                                            else max(row[j + 1], row[j]))
+    return row[-1]
+
+
+def test_matches_are_a_longest_common_subsequence():
+    rnd = random.Random(7)
+    for _ in range(300):
+        a = array('q', (rnd.randrange(4) for _ in range(rnd.randrange(12))))
+        b = array('q', (rnd.randrange(4) for _ in range(rnd.randrange(12))))
+        runs = list(_matches(a, b))
+        i = j = 0
+        for i1, j1, size in runs:
+            assert i1 >= i and j1 >= j and size > 0
+            assert a[i1:i1 + size] == b[j1:j1 + size]
+            i, j = i1 + size, j1 + size
+        assert sum(size for _, _, size in runs) == _lcs(a, b)
+
+
+def test_patience_runs_are_valid():
+    rnd = random.Random(5)
+    for _ in range(300):
+        a = array('q', (rnd.randrange(6) for _ in range(rnd.randrange(14))))
+        b = array('q', (rnd.randrange(6) for _ in range(rnd.randrange(14))))
+        i = j = 0
+        for i1, j1, size in _patience_matches(a, b):
+            assert i1 >= i and j1 >= j and size > 0
+            assert a[i1:i1 + size] == b[j1:j1 + size]
+            i, j = i1 + size, j1 + size
+
+
+def _edited(n, changes, seed=3):
+    rnd = random.Random(seed)
+    a = [f'line {i}' for i in range(n)]
+    b = list(a)
+    for k in rnd.sample(range(n), changes):
+        b[k] = f'changed {k}'
+    return a, b
+
+
+def test_myers_only_sees_the_gaps_between_unique_lines(monkeypatch):
+    sizes = []
+
+    def spy(a, b, a0=0, a1=None, b0=0, b1=None):
+        sizes.append((a1 - a0) + (b1 - b0))
+        return _matches(a, b, a0, a1, b0, b1)
+
+    monkeypatch.setattr(anansi, '_matches', spy)
+    a, b = _edited(20000, 6000)
+    ops = list(diff_opcodes(a, b))
+    assert max(sizes, default=0) < 100
+    assert sum(i2 - i1 for tag, i1, i2, _, _ in ops if tag != 'equal') \
+        == 6000
+
+
+def test_large_diff_is_fast():
+    a, b = _edited(200000, 200)
+    start = time.perf_counter()
+    ours = list(unified_diff(a, b, color=False))
+    assert time.perf_counter() - start < 10
+    assert ours == list(difflib.unified_diff(a, b, 'a', 'b', lineterm=''))
+
+
+def test_identical_inputs_print_nothing():
+    assert list(unified_diff(['x', 'y'], ['x', 'y'])) == []
+
+
+def test_opcodes_rebuild_b():
+    rnd = random.Random(11)
+    for _ in range(200):
+        a = [rnd.choice('abc') for _ in range(rnd.randrange(10))]
+        b = [rnd.choice('abc') for _ in range(rnd.randrange(10))]
+        out, i = [], 0
+        for tag, i1, i2, j1, j2 in diff_opcodes(a, b):
+            assert i1 == i
+            out += a[i1:i2] if tag == 'equal' else b[j1:j2]
+            i = i2
+        assert i == len(a) and out == b
+
+
+def test_opcodes_ignore_escapes():
+    a = [f'{Ansi.GO}same{Ansi.RESET}']
+    assert list(diff_opcodes(a, ['same'])) == [('equal', 0, 1, 0, 1)]
+
+
+def _headers(lines):
+    return [line for line in lines if line.startswith('@@')]
+
+
+def test_hunk_headers_match_difflib():
+    cases = [(['a', 'b', 'c'], ['a', 'X', 'b', 'c'], 0),
+             (['a', 'b', 'c'], ['a', 'c'], 0),
+             ([], ['x'], 3), (['x'], [], 3),
+             (list('abcdefghij'), list('abcXefghiY'), 1)]
+    for a, b, n in cases:
+        ours = unified_diff(a, b, n=n, color=False)
+        theirs = difflib.unified_diff(a, b, n=n, lineterm='')
+        assert _headers(ours) == _headers(theirs)
+
+
+def test_side_by_side_marks_change_past_column():
+    a = ['0123456789 old']
+    b = ['0123456789 new']
+    plain = list(side_by_side(a, b, width=23, color=False))
+    assert plain == ['0123456789 | 0123456789']
+    row, = side_by_side(a, b, width=23)
+    left, right = row.split(' | ')
+    assert left.startswith(DIFF_DELETE) and left.endswith(Ansi.RESET)
+    assert right.startswith(DIFF_INSERT) and right.endswith(Ansi.RESET)
+
+
+def test_side_by_side_keeps_wide_marks_in_column():
+    row, = side_by_side(['日本語'], ['日本人'], width=11)
+    left, right = row.split(' | ')
+    assert Ansi.ANSI_ESCAPE.sub('', left) == '日本'
+    assert left.endswith(Ansi.RESET)
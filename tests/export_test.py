@@ -0,0 +1,32 @@
+import io
+import json
+
+from anansi import *
+
+
+def _records(lines):
+    return [json.loads(r) for r in export_spans(lines)]
+
+
+def test_plain_and_styled_runs():
+    red = Ansi.FMT_8BIT_FG.format(196)
+    lines = ['plain', f'a{red}\x1B[1mbc{Ansi.RESET}d']
+    assert _records(lines) == [
+        {'text': 'plain', 'spans': []},
+        {'text': 'abcd', 'spans': [[1, 3, 196, None, [1]]]}]
+
+
+def test_open_style_carries_to_next_line():
+    rgb = '\x1B[48;2;1;2;3m'
+    assert _records([f'{rgb}x', 'yz', '', f'{Ansi.RESET}w']) == [
+        {'text': 'x', 'spans': [[0, 1, None, '#010203', []]]},
+        {'text': 'yz', 'spans': [[0, 2, None, '#010203', []]]},
+        {'text': '', 'spans': []},
+        {'text': 'w', 'spans': []}]
+
+
+def test_write_spans_one_record_per_line():
+    out = io.StringIO()
+    write_spans(io.StringIO('a\nb\n'), out)
+    assert out.getvalue().splitlines() == [
+        '{"text":"a","spans":[]}', '{"text":"b","spans":[]}']
@@ -0,0 +1,56 @@
+import io
+import logging
+
+from anansi import *
+
+
+def _record(levelno=logging.ERROR, name='svc'):
+    return logging.makeLogRecord({'msg': 'm', 'levelno': levelno, 'name': name,
+                                  'levelname': logging.getLevelName(levelno)})
+
+
+def test_formatter_styles_are_precomputed():
+    f = AnsiFormatter(color=True)
+    assert f.format(_record()) == \
+        f'{Ansi.WARN}ERROR   {Ansi.RESET} {Ansi.MAIN}svc{Ansi.RESET}: m'
+    assert f.format(_record(), False) == \
+        f'{Ansi.WARN}ERROR   {Ansi.RESET} {Ansi.MAIN}svc{Ansi.RESET}: m'
+    assert AnsiFormatter(color=False).format(_record()) == 'ERROR    svc: m'
+
+
+def test_stream_handler_colors_only_ttys():
+    out = io.StringIO()
+    log = logging.getLogger('anansi.test.handler')
+    log.propagate = False
+    handler = AnsiStreamHandler(out)
+    log.addHandler(handler)
+    try:
+        log.error('plain %s', 'text')
+    finally:
+        log.removeHandler(handler)
+    assert out.getvalue() == 'ERROR    anansi.test.handler: plain text\n'
+
+
+def test_queue_logging_replaces_earlier_setup():
+    first, second = io.StringIO(), io.StringIO()
+    log = logging.getLogger('anansi.test.queue')
+    log.propagate = False
+    queue_logging(log, first, logging.INFO)
+    listener = queue_logging(log, second, logging.INFO)
+    log.info('once')
+    listener.stop()
+    assert len(log.handlers) == 1
+    assert first.getvalue() == ''
+    assert second.getvalue() == 'INFO     anansi.test.queue: once\n'
+
+
+def test_queue_logging_shows_values_at_call_time():
+    out = io.StringIO()
+    log = logging.getLogger('anansi.test.values')
+    log.propagate = False
+    listener = queue_logging(log, out, logging.INFO)
+    items = [1]
+    log.info('items=%s', items)
+    items.append(2)
+    listener.stop()
+    assert out.getvalue() == 'INFO     anansi.test.values: items=[1]\n'
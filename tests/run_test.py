@@ -0,0 +1,40 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip('pty')
+
+ANANSI = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'anansi.py')
+
+
+def _anansi(*args):
+    return subprocess.run([sys.executable, ANANSI, 'run', *args],
+                          stdin=subprocess.DEVNULL, capture_output=True,
+                          timeout=20)
+
+
+def test_child_sees_a_tty_and_exit_status_is_kept():
+    p = _anansi('--', 'sh', '-c', '[ -t 1 ] && echo tty; exit 3')
+    assert p.stdout == b'tty\r\n'
+    assert p.returncode == 3
+
+
+def test_highlight_keeps_style_from_earlier_chunks():
+    script = r'printf "\033[31mstart\n"; sleep .3; printf "an error here\n"'
+    p = _anansi('-P', 'err', '--', 'sh', '-c', script)
+    assert p.stdout.endswith(b'an \x1b[7merr\x1b[0m\x1b[31mor here\r\n')
+
+
+def test_trailing_partial_utf8_is_not_dropped():
+    p = _anansi('-P', 'x', '--', 'sh', '-c', r"printf 'caf\303'")
+    assert p.stdout == 'caf�'.encode()
+
+
+def test_usage_errors():
+    for args in (['-P'], ['--pattern'], [], ['--']):
+        p = _anansi(*args)
+        assert p.returncode == 2
+        assert b'usage: anansi run' in p.stderr
+    assert _anansi('--', 'no-such-command-here').returncode == 127
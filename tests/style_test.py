@@ -0,0 +1,52 @@
+import random
+
+from anansi import *
+
+
+def _random_style(rnd):
+    effects = rnd.sample(Style.EFFECTS, rnd.randint(0, 3))
+    colors = [None, rnd.randrange(256), (rnd.randrange(256),) * 3]
+    return Style.make(*effects, fg=rnd.choice(colors), bg=rnd.choice(colors))
+
+
+def test_parse_ansi_strings():
+    style = Style.parse(Ansi.BOLD + Ansi.WARN)
+    assert style.fg == (Style.PALETTE, 203)
+    assert style.effects == Style.EFFECT_BITS[1]
+    assert style.sgr == '\x1b[1;38;5;203m'
+    assert Style.parse(Ansi.BRIGHTRED).sgr == '\x1b[1;31m'
+    assert Style.parse('\x1b[91;104m').sgr == '\x1b[91;104m'
+    assert Style.parse(Ansi.RESET) == Style() and Style().sgr == Ansi.RESET
+
+
+def test_sgr_round_trip():
+    rnd = random.Random(7)
+    for _ in range(500):
+        style = _random_style(rnd)
+        assert Style.parse(style.sgr) == style
+
+
+def test_diff_round_trip():
+    rnd = random.Random(11)
+    for _ in range(500):
+        a, b = _random_style(rnd), _random_style(rnd)
+        assert Style.parse(a.sgr + a.diff(b)) == b
+        assert a.diff(a) == ''
+
+
+def test_interning_and_rgb():
+    assert Style.parse(Ansi.GO) is Style.make(fg=28)
+    rgb = Style.make(fg=(1, 2, 3))
+    assert rgb == Style.make(fg=(1, 2, 3))
+    assert int(rgb) not in Style._interned
+
+
+def test_bitwise_operations_return_styles():
+    bold_red = Style.parse(Ansi.BOLD + Ansi.RED)
+    blue = Style.parse(Ansi.BLUE)
+    assert (bold_red | blue).fg == blue.fg
+    assert (bold_red | blue).effects == bold_red.effects
+    no_fg = bold_red & ~Style(Style.FG_MASK)
+    assert isinstance(no_fg, Style) and no_fg == Style.parse(Ansi.BOLD)
+    assert isinstance(bold_red ^ blue, Style)
+    assert (bold_red ^ Style.parse(Ansi.BOLD)).effects == 0
@@ -0,0 +1,41 @@
+import io
+
+from anansi import *
+
+
+def test_visible_width_ignores_escapes():
+    assert visible_width(f'{Ansi.GO}abc{Ansi.RESET}') == 3
+    assert visible_width('日本') == 4
+
+
+def test_columns_from_sample():
+    rows = [('a', 1), (f'{Ansi.GO}bbb{Ansi.RESET}', 22)]
+    lines = list(table_lines(rows, headers=('name', 'n'), color=False))
+    assert lines == ['name |  n', '-----|---',
+                     'a    |  1', f'{Ansi.GO}bbb{Ansi.RESET}  | 22']
+
+
+def test_ragged_rows_past_sample():
+    assert list(table_lines([[1], [1, 2, 3]], sample=1)) == ['1', '1 | 2 | 3']
+    styled = list(table_lines(iter([['x'], ['y', 'z']]), sample=1,
+                              styles=(Ansi.GO,)))
+    assert styled[1] == f'{Ansi.GO}y{Ansi.RESET} | z'
+
+
+def test_streams_without_reading_everything():
+    def rows():
+        yield ('first',)
+        raise AssertionError('read past the sample')
+    assert next(table_lines(rows(), sample=1)) == 'first'
+
+
+def test_full_scan_needs_reiterable():
+    try:
+        list(table_lines(iter([]), sample=None))
+    except TypeError:
+        pass
+    else:
+        raise AssertionError('expected TypeError')
+    out = io.StringIO()
+    print_table([('a',), ('bb',)], sample=None, file=out, headers=('h',))
+    assert out.getvalue().splitlines()[2:] == ['a', 'bb']
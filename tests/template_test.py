@@ -0,0 +1,50 @@
+import os
+import subprocess
+import sys
+
+from anansi import *
+
+
+def test_compile_template_flat_parts():
+    t = compile_template('{BLUE}{name}{RESET} is {0}')
+    assert t.parts == [Ansi.BLUE, '', f'{Ansi.RESET} is ', '', '']
+    assert t.fields == [(1, 'name'), (3, 0)]
+    assert t.render('up', name='disk') == f'{Ansi.BLUE}disk{Ansi.RESET} is up'
+
+
+def test_compile_template_is_cached():
+    assert compile_template('[bold]x[/]') is compile_template('[bold]x[/]')
+
+
+def test_style_tags():
+    t = compile_template('[bold red on blue]x[/]')
+    assert t.render() == f'{Ansi.BOLD}{Ansi.RED}{Ansi.BBLUE}x{Ansi.RESET}'
+    assert compile_template('[on color22]x').render() == f'{Ansi.BG_COLOR22}x'
+
+
+def test_non_style_brackets_pass_through():
+    for s in ('[WARN] disk low', '[WARNING] x', '[1/2]', '[tab]', '[esc]',
+              '[suffix]', '[bold nope]'):
+        assert compile_template(s).render() == s
+
+
+def test_non_style_names_are_fields():
+    t = compile_template('{FMT_8BIT_FG}{TAB}')
+    assert t.render(FMT_8BIT_FG='a', TAB='b') == 'ab'
+
+
+def test_escaped_braces_and_no_color():
+    assert compile_template('{{x}}').render() == '{x}'
+    assert compile_template('{GO}ok[/]', False).render() == 'ok'
+
+
+def test_cli_prints_only_the_template_and_reports_missing_fields():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, USER='bob')
+    env.pop('NO_SUCH_FIELD', None)
+    p = subprocess.run([sys.executable, 'anansi.py', '{USER} ok'], cwd=root,
+                       env=env, capture_output=True, text=True)
+    assert (p.returncode, p.stdout.strip()) == (0, 'bob ok')
+    p = subprocess.run([sys.executable, 'anansi.py', '{NO_SUCH_FIELD}'],
+                       cwd=root, env=env, capture_output=True, text=True)
+    assert p.returncode == 1 and 'NO_SUCH_FIELD' in p.stderr
@@ -0,0 +1,38 @@
+from anansi import *
+
+RAW = (f"{Ansi.BOLD}{Ansi.BLUE7}a{Ansi.BRIGHTRED}b"
+       f"\x1b[38;2;250;0;0mc\x1b[40md{Ansi.RESET}\n")
+
+
+def test_sub_rewrites_colors_only():
+    theme = ThemeMap({Ansi.BLUE7: Ansi.BLUE, 0: 236, Ansi.RED: (1, 2, 3)},
+                     to_256=True, nearest=True)
+    assert theme.sub(RAW) == ('\x1b[1m\x1b[38;5;38ma\x1b[38;2;1;2;3;1mb'
+                              '\x1b[38;5;196mc\x1b[48;5;236md\x1b[0m\n')
+    assert theme.sub('no escapes') == 'no escapes'
+
+
+def test_identity_theme_passes_through():
+    assert ThemeMap().sub(RAW) == RAW
+
+
+def test_stream_with_escapes_split_across_chunks():
+    theme = ThemeMap({Ansi.BLUE7: 38}, to_256=True, nearest=True)
+    whole = theme.sub(RAW)
+    for size in range(1, len(RAW) + 1):
+        chunks = [RAW[i:i + size] for i in range(0, len(RAW), size)]
+        assert ''.join(theme.stream(chunks)) == whole
+
+
+def test_stream_passes_complete_escapes_at_once():
+    lines = ['save\x1b7 here\n', 'keypad\x1b=\n', 'line three\n']
+    out = ThemeMap().stream(iter(lines))
+    assert [next(out) for _ in lines] == lines
+    held = ThemeMap().stream(iter(['a\x1b[1;3', '1mb', 'c\x1b']))
+    assert list(held) == ['a', '\x1b[1;31mb', 'c', '\x1b']
+
+
+def test_nearest_256():
+    assert nearest_256(255, 0, 0) == 196
+    assert nearest_256(128, 128, 128) == 244
+    assert nearest_256(0, 0, 0) == 16
@@ -0,0 +1,55 @@
+import random
+from itertools import chain
+
+from anansi import *
+
+RAW = f"{Ansi.BLUE}This is blue{Ansi.RESET} ... and {Ansi.CHERRY}this is red."
+
+
+def test_strips_once():
+    v = VisibleText(RAW)
+    assert v.text == Ansi.ANSI_ESCAPE.sub('', RAW)
+
+
+def test_every_offset_maps_to_the_same_character():
+    rnd = random.Random(3)
+    codes = [Ansi.BOLD, Ansi.RED, Ansi.RESET, Ansi.FMT_8BIT_FG.format(22)]
+    for _ in range(200):
+        raw = ''.join(rnd.choice(codes) if rnd.random() < 0.3
+                      else rnd.choice('abc ') for _ in range(30))
+        v = VisibleText(raw)
+        for i, c in enumerate(v.text):
+            start = v.raw_index(i)
+            assert raw[start] == c
+            assert raw[v.raw_index(i + 1, True) - 1] == c
+
+
+def test_search_spans_in_both_coordinates():
+    v = VisibleText(RAW)
+    matches = list(v.search('blue ... and this', regex=False))
+    assert len(matches) == 1
+    m = matches[0]
+    assert v.text[m.start:m.end] == m.text
+    assert Ansi.ANSI_ESCAPE.sub('', RAW[m.raw_start:m.raw_end]) == m.text
+    assert RAW[m.raw_start:].startswith('blue')
+    assert RAW[:m.raw_end].endswith('this')
+
+
+def test_style_at_and_highlight_restores_style():
+    v = VisibleText(RAW)
+    assert v.style_at(0) == Style.parse(Ansi.BLUE)
+    assert v.style_at(len(v.text) - 1) == Style.parse(Ansi.CHERRY)
+    out = v.highlight('this', Ansi.REVERSE)
+    assert out.endswith(f'{Ansi.REVERSE}this{Ansi.RESET}'
+                        f'{Style.parse(Ansi.CHERRY)} is red.')
+    assert Ansi.ANSI_ESCAPE.sub('', out) == v.text
+
+
+def test_empty_matches_have_an_empty_raw_span():
+    raw = f'ab{Ansi.RED}cd{Ansi.RESET}ef'
+    v = VisibleText(raw)
+    for m in chain(v.search(''), v.search(r'\b'), v.search(r'(?=c)')):
+        assert m.raw_start == m.raw_end
+    m = next(v.search(r'(?=c)'))
+    assert (m.start, m.end, m.raw_start) == (2, 2, 2 + len(Ansi.RED))
+    assert v.highlight(r'\b') == raw